@@ -0,0 +1,30 @@
+"""Helpers for reading app configuration from Streamlit secrets."""
+from __future__ import annotations
+
+from collections.abc import Mapping
+from typing import Any
+
+import streamlit as st
+
+
+def coerce_bool(value: Any) -> bool:
+    """Convert string-ish truthy values to bool."""
+    if isinstance(value, str):
+        return value.strip().lower() in {"1", "true", "yes", "on"}
+    return bool(value)
+
+
+def get_secret_section(name: str) -> dict[str, Any]:
+    """Safely retrieve a secrets section as a plain dict."""
+    try:
+        section = st.secrets[name]
+    except Exception:  # pragma: no cover - secrets missing
+        return {}
+
+    if isinstance(section, Mapping):
+        return dict(section)
+
+    if hasattr(section, "items"):
+        return {key: val for key, val in section.items()}
+
+    return {}
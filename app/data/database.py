@@ -1,38 +1,147 @@
-"""Database configuration and helpers."""
+"""Database configuration and helpers.
+
+Users and the shard map live in a small directory database; goals,
+milestones and progress logs live in one of ``SHARD_COUNT`` shard databases,
+chosen per user by :mod:`app.data.sharding`.
+"""
 from __future__ import annotations
 
+import os
+import threading
+from collections.abc import Mapping
 from contextlib import contextmanager
-from typing import Iterator
+from typing import Any, Iterator
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session, declarative_base, sessionmaker
 
 DEFAULT_DB_URL = "sqlite:///planos.db"
+SHARD_DB_URL_TEMPLATE = os.environ.get("PLANOS_SHARD_URL_TEMPLATE", "sqlite:///planos_shard_{index}.db")
+SHARD_COUNT = int(os.environ.get("PLANOS_DB_SHARDS", "4"))
+
+WROTE_KEY = "planos_wrote"
+
+DIRECTORY_TABLES = ("users", "shard_assignments")
+SHARDED_TABLES = ("goals", "milestones", "progress_logs", "legacy_goal_imports")
+
+
+def _enable_wal(dbapi_connection: Any, connection_record: Any) -> None:
+    """Use WAL so readers do not block on, or block, the single writer."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+
+
+def _create_engine(url: str) -> Engine:
+    """Create an engine with the app's SQLite defaults."""
+    new_engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        future=True,
+        echo=False,
+    )
+    if new_engine.dialect.name == "sqlite":
+        event.listen(new_engine, "connect", _enable_wal)
+    return new_engine
 
-engine = create_engine(
-    DEFAULT_DB_URL,
-    connect_args={"check_same_thread": False},
-    future=True,
-    echo=False,
-)
+
+engine = _create_engine(DEFAULT_DB_URL)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 Base = declarative_base()
 
 
-def init_db() -> None:
-    """Create tables based on metadata."""
+@event.listens_for(SessionLocal, "after_flush")
+def _mark_written(session: Session, flush_context: Any) -> None:
+    """Remember that a session wrote rows, so its shard can be re-checked."""
+    session.info[WROTE_KEY] = True
+
+
+_shard_engines: dict[int, Engine] = {}
+_shard_engines_lock = threading.Lock()
+_initialized_engines: set[Engine] = set()
+_initialized_engines_lock = threading.Lock()
+
+
+def _create_tables(target: Engine, names: tuple[str, ...]) -> None:
+    """Create the named tables once per engine and process."""
+    if target in _initialized_engines:
+        return
     # Imported locally to avoid circular imports.
     from app.data import models  # pylint: disable=unused-import
 
-    Base.metadata.create_all(bind=engine)
+    with _initialized_engines_lock:
+        if target not in _initialized_engines:
+            tables = Base.metadata.tables
+            Base.metadata.create_all(bind=target, tables=[tables[name] for name in names])
+            _initialized_engines.add(target)
+
+
+def get_shard_engine(index: int) -> Engine:
+    """Return the cached engine for a shard, creating it and its tables on first use.
+
+    Indexes at or above ``SHARD_COUNT`` are accepted so users still assigned to
+    a shard retired by lowering the count keep working until rebalanced.
+    """
+    if index < 0:
+        raise ValueError(f"Invalid shard index {index}")
+    shard_engine = _shard_engines.get(index)
+    if shard_engine is None:
+        with _shard_engines_lock:
+            shard_engine = _shard_engines.get(index)
+            if shard_engine is None:
+                shard_engine = _create_engine(SHARD_DB_URL_TEMPLATE.format(index=index))
+                _create_tables(shard_engine, SHARDED_TABLES)
+                _shard_engines[index] = shard_engine
+    return shard_engine
+
+
+def init_db() -> None:
+    """Create directory tables based on metadata.
+
+    Runs ``create_all`` only on the first call per process; shard tables are
+    created by :func:`get_shard_engine` when a shard is first used.
+    """
+    _create_tables(engine, DIRECTORY_TABLES)
+
+
+def shard_session(index: int) -> Session:
+    """Open a session bound directly to a single shard."""
+    return SessionLocal(bind=get_shard_engine(index))
 
 
 @contextmanager
-def get_session() -> Iterator[Session]:
-    """Provide a transactional scope around a series of operations."""
-    session = SessionLocal()
+def get_session(user: Mapping[str, Any] | None = None) -> Iterator[Session]:
+    """Provide a transactional scope around a series of operations.
+
+    Without ``user`` the session only reaches the directory database. With a
+    user context, goal data is routed to that user's shard; this raises
+    :class:`app.data.sharding.UserMovingError` while the user is being moved.
+    Sessions that wrote re-check the assignment while holding the shard's
+    write lock, so a write racing a move fails instead of landing on the old
+    shard.
+    """
+    binds = {}
+    shard = None
+    if user is not None:
+        # Imported locally to avoid circular imports.
+        from app.data import models
+        from app.data.sharding import resolve_shard
+
+        shard = resolve_shard(user)
+        shard_engine = get_shard_engine(shard)
+        sharded_models = (models.Goal, models.Milestone, models.ProgressLog, models.LegacyGoalImport)
+        binds = {model: shard_engine for model in sharded_models}
+
+    session = SessionLocal(binds=binds)
     try:
         yield session
+        if shard is not None:
+            session.flush()
+            if session.info.get(WROTE_KEY):
+                from app.data.sharding import verify_shard
+
+                verify_shard(user, shard)
         session.commit()
     except Exception:
         session.rollback()
@@ -4,7 +4,7 @@ from __future__ import annotations
 from datetime import datetime
 from typing import List
 
-from sqlalchemy import Date, DateTime, Float, ForeignKey, Integer, String, Text
+from sqlalchemy import Boolean, Date, DateTime, Float, ForeignKey, Integer, String, Text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.data.database import Base
@@ -20,7 +20,8 @@ class User(Base):
     picture_url: Mapped[str | None] = mapped_column(String(512), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
-    goals: Mapped[List["Goal"]] = relationship(back_populates="owner", cascade="all, delete-orphan")
+    # No ``goals`` relationship: users live in the directory database and goals
+    # on a shard, so a single session cannot load or cascade across them.
 
 
 class Goal(Base):
@@ -39,7 +40,6 @@ class Goal(Base):
     end_date: Mapped[datetime | None] = mapped_column(Date, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
-    owner: Mapped[User] = relationship(back_populates="goals")
     milestones: Mapped[List["Milestone"]] = relationship(
         back_populates="goal",
         cascade="all, delete-orphan",
@@ -75,3 +75,21 @@ class ProgressLog(Base):
     note: Mapped[str | None] = mapped_column(Text, nullable=True)
 
     goal: Mapped[Goal] = relationship(back_populates="progress_logs")
+
+
+class ShardAssignment(Base):
+    __tablename__ = "shard_assignments"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    shard: Mapped[int] = mapped_column(Integer, index=True)
+    moving: Mapped[bool] = mapped_column(Boolean, default=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class LegacyGoalImport(Base):
+    """Marks a goal copied from the unsharded database, in the same shard transaction."""
+
+    __tablename__ = "legacy_goal_imports"
+
+    legacy_goal_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    goal_id: Mapped[int] = mapped_column(ForeignKey("goals.id", ondelete="CASCADE"), index=True)
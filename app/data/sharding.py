@@ -0,0 +1,282 @@
+"""Shard routing and rebalancing for per-user data.
+
+Each user is mapped to a shard through the ``shard_assignments`` table of the
+directory database. New users are placed by a stable hash of ``google_sub``
+(falling back to ``User.id``); the assignment is then authoritative, so users
+can be moved with :func:`move_user` without changing the hash. Assignments are
+read on every :func:`~app.data.database.get_session` call, so moves made from
+the command line take effect in running app processes immediately.
+
+Run ``python -m app.data.sharding --help`` for the rebalancing commands.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+from collections.abc import Mapping
+from typing import Any, TypeVar
+
+from sqlalchemy import inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload
+
+from app.data import database
+from app.data.database import SessionLocal, get_session, init_db, shard_session
+from app.data.models import Goal, LegacyGoalImport, ShardAssignment, User
+
+T = TypeVar("T")
+
+
+class UserMovingError(RuntimeError):
+    """Raised when a user's data is accessed while it is moved between shards."""
+
+
+def shard_for_key(key: str | int) -> int:
+    """Return the hash-based home shard for a user key."""
+    digest = hashlib.sha256(str(key).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % database.SHARD_COUNT
+
+
+def _placement_key(user: Mapping[str, Any]) -> str | int:
+    return user.get("google_sub") or user["id"]
+
+
+def _get_assignment(db: Session, user: Mapping[str, Any]) -> ShardAssignment:
+    """Load a user's shard assignment, creating it from the hash if missing."""
+    assignment = db.get(ShardAssignment, user["id"])
+    if assignment is None:
+        assignment = ShardAssignment(
+            user_id=user["id"],
+            shard=shard_for_key(_placement_key(user)),
+            moving=False,
+        )
+        db.add(assignment)
+        try:
+            db.flush()
+        except IntegrityError:
+            # Another session assigned the user concurrently; use its choice.
+            db.rollback()
+            assignment = db.get(ShardAssignment, user["id"])
+    return assignment
+
+
+def resolve_shard(user: Mapping[str, Any]) -> int:
+    """Return the shard holding a user's data, assigning one if needed."""
+    if user.get("id") is None:
+        return shard_for_key(_placement_key(user))
+
+    with get_session() as db:
+        assignment = _get_assignment(db, user)
+        if assignment.moving:
+            raise UserMovingError(f"User {user['id']} is being moved between shards; try again shortly")
+        return assignment.shard
+
+
+def verify_shard(user: Mapping[str, Any], shard: int) -> None:
+    """Fail unless ``shard`` is still the user's settled assignment.
+
+    Called by writing sessions after their flush, i.e. while they hold the
+    shard's write lock, which :func:`move_user` also holds while copying.
+    """
+    if user.get("id") is None:
+        return
+    with get_session() as db:
+        assignment = db.get(ShardAssignment, user["id"])
+        if assignment is None or assignment.moving or assignment.shard != shard:
+            raise UserMovingError(f"User {user['id']} was moved between shards; try again")
+
+
+def _clone(instance: T, exclude: tuple[str, ...] = ()) -> T:
+    """Copy the column values of an ORM instance into a new transient one."""
+    mapper = inspect(instance).mapper
+    values = {
+        attr.key: getattr(instance, attr.key)
+        for attr in mapper.column_attrs
+        if attr.key not in exclude
+    }
+    return type(instance)(**values)
+
+
+def _copy_goal(goal: Goal) -> Goal:
+    """Copy a goal with its milestones and logs; ids are reassigned by the target."""
+    copy = _clone(goal, exclude=("id",))
+    copy.milestones = [_clone(item, exclude=("id", "goal_id")) for item in goal.milestones]
+    copy.progress_logs = [_clone(item, exclude=("id", "goal_id")) for item in goal.progress_logs]
+    return copy
+
+
+def _load_imports(db: Session, goals: list[Goal]) -> list[LegacyGoalImport]:
+    goal_ids = [goal.id for goal in goals]
+    return db.query(LegacyGoalImport).filter(LegacyGoalImport.goal_id.in_(goal_ids)).all()
+
+
+def _load_goals(db: Session, user_id: int) -> list[Goal]:
+    return (
+        db.query(Goal)
+        .options(selectinload(Goal.milestones), selectinload(Goal.progress_logs))
+        .filter(Goal.owner_id == user_id)
+        .all()
+    )
+
+
+def move_user(user_id: int, target_shard: int) -> int:
+    """Move a user's goals, milestones and logs to another shard.
+
+    The user is flagged as moving, so new sessions for them fail with
+    :class:`UserMovingError`, and the source shard's write lock is held for the
+    whole move. Sessions opened before the flag re-check the assignment under
+    that lock before committing (see :func:`verify_shard`): a write that got
+    the lock first sees the flag and rolls back, and one that waited sees the
+    new shard and rolls back, so no write lands on the old shard.
+    Rows left on the target by an interrupted move are replaced, so the move
+    can simply be re-run. If the process dies after the shard map is updated,
+    stale rows may remain on the source; they are never read and are replaced
+    if the user moves back. Returns the number of goals moved.
+    """
+    if not 0 <= target_shard < database.SHARD_COUNT:
+        raise ValueError(f"Shard {target_shard} out of range (0..{database.SHARD_COUNT - 1})")
+
+    with get_session() as db:
+        user = db.get(User, user_id)
+        if user is None:
+            raise ValueError(f"User {user_id} not found")
+        assignment = _get_assignment(db, {"id": user.id, "google_sub": user.google_sub})
+        source_shard = assignment.shard
+        assignment.moving = source_shard != target_shard
+    if source_shard == target_shard:
+        return 0
+
+    switched = False
+    source_conn = database.get_shard_engine(source_shard).connect()
+    source = SessionLocal(bind=source_conn)
+    target = shard_session(target_shard)
+    try:
+        # Take the write lock up front; waits for in-flight writers to commit.
+        source_conn.exec_driver_sql("BEGIN IMMEDIATE")
+        goals = _load_goals(source, user_id)
+        imports = _load_imports(source, goals)
+
+        stale_goals = _load_goals(target, user_id)
+        for stale in [*_load_imports(target, stale_goals), *stale_goals]:
+            target.delete(stale)
+        target.flush()
+        copies = {goal.id: _copy_goal(goal) for goal in goals}
+        target.add_all(copies.values())
+        target.flush()
+        target.add_all([
+            LegacyGoalImport(legacy_goal_id=item.legacy_goal_id, goal_id=copies[item.goal_id].id)
+            for item in imports
+        ])
+        target.commit()
+
+        with get_session() as db:
+            assignment = db.get(ShardAssignment, user_id)
+            assignment.shard = target_shard
+            assignment.moving = False
+        switched = True
+
+        for item in [*imports, *goals]:
+            source.delete(item)
+        source.flush()
+        source_conn.commit()
+    except Exception:
+        source.rollback()
+        source_conn.rollback()
+        target.rollback()
+        if not switched:
+            # The source is still complete and authoritative; unlock the user.
+            with get_session() as db:
+                db.get(ShardAssignment, user_id).moving = False
+        raise
+    finally:
+        source.close()
+        source_conn.close()
+        target.close()
+    return len(goals)
+
+
+def rebalance() -> dict[int, int]:
+    """Move every user whose assignment differs from its hash home shard.
+
+    Run after changing ``PLANOS_DB_SHARDS``; after lowering it, keep the
+    retired shard files until this finishes. Returns moved goal counts by
+    user id.
+    """
+    with get_session() as db:
+        rows = (
+            db.query(User.id, User.google_sub, ShardAssignment.shard)
+            .join(ShardAssignment, ShardAssignment.user_id == User.id)
+            .all()
+        )
+    moved = {}
+    for user_id, google_sub, shard in rows:
+        home = shard_for_key(_placement_key({"id": user_id, "google_sub": google_sub}))
+        if shard != home:
+            moved[user_id] = move_user(user_id, home)
+    return moved
+
+
+def migrate_legacy() -> int:
+    """Move goals left in the directory database by the unsharded layout.
+
+    Copies get new ids on the shard. Each copy is committed together with a
+    :class:`LegacyGoalImport` marker, so re-running after an interruption skips
+    goals that were already copied. Returns the number of goals migrated.
+    """
+    if not inspect(database.engine).has_table("goals"):
+        return 0
+
+    legacy = SessionLocal()
+    try:
+        goals = (
+            legacy.query(Goal)
+            .options(selectinload(Goal.milestones), selectinload(Goal.progress_logs))
+            .all()
+        )
+        migrated = 0
+        for goal in goals:
+            owner = legacy.get(User, goal.owner_id)
+            if owner is None:
+                continue
+            with get_session({"id": owner.id, "google_sub": owner.google_sub}) as db:
+                if db.get(LegacyGoalImport, goal.id) is None:
+                    copy = _copy_goal(goal)
+                    db.add(copy)
+                    db.flush()
+                    db.add(LegacyGoalImport(legacy_goal_id=goal.id, goal_id=copy.id))
+            legacy.delete(goal)
+            legacy.commit()
+            migrated += 1
+    except Exception:
+        legacy.rollback()
+        raise
+    finally:
+        legacy.close()
+    return migrated
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Command line entry point for shard maintenance."""
+    parser = argparse.ArgumentParser(description="Manage user shards.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    move_parser = commands.add_parser("move", help="Move one user to a shard.")
+    move_parser.add_argument("user_id", type=int)
+    move_parser.add_argument("shard", type=int)
+    commands.add_parser("rebalance", help="Move users back to their hash home shard.")
+    commands.add_parser("migrate-legacy", help="Move goals from the unsharded database.")
+    args = parser.parse_args(argv)
+
+    init_db()
+    if args.command == "move":
+        count = move_user(args.user_id, args.shard)
+        print(f"Moved {count} goal(s) of user {args.user_id} to shard {args.shard}.")
+    elif args.command == "migrate-legacy":
+        count = migrate_legacy()
+        print(f"Migrated {count} goal(s) to their shards.")
+    else:
+        moved = rebalance()
+        print(f"Moved {len(moved)} user(s), {sum(moved.values())} goal(s).")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,6 @@ from __future__ import annotations
 import os
 import secrets
 import sys
-from collections.abc import Mapping
 from pathlib import Path
 from typing import Any
 from urllib.parse import urlencode
@@ -18,36 +17,15 @@ if __package__ is None:  # Ensure repository root is importable when run as scri
         sys.path.append(repo_root_str)
 
 from app.auth import google, session
+from app.config import coerce_bool, get_secret_section
 from app.data.database import get_session, init_db
 from app.data.models import User
+from app.profiling import phase, profile_page
 from app.ui.layout import app_header, sidebar_menu
 
 STATE_KEY = "oauth_state"
 
 
-def _coerce_bool(value: Any) -> bool:
-    """Convert string-ish truthy values to bool."""
-    if isinstance(value, str):
-        return value.strip().lower() in {"1", "true", "yes", "on"}
-    return bool(value)
-
-
-def _get_secret_section(name: str) -> dict[str, Any]:
-    """Safely retrieve a secrets section as a plain dict."""
-    try:
-        section = st.secrets[name]
-    except Exception:  # pragma: no cover - secrets missing
-        return {}
-
-    if isinstance(section, Mapping):
-        return dict(section)
-
-    if hasattr(section, "items"):
-        return {key: val for key, val in section.items()}
-
-    return {}
-
-
 def _ensure_oauth_state() -> str:
     """Generate and memoize an OAuth state token."""
     if STATE_KEY not in st.session_state:
@@ -111,26 +89,29 @@ def _ensure_guest_user() -> dict[str, Any]:
         }
 
 
+@profile_page("main")
 def main() -> None:
     """Run Streamlit application."""
-    init_db()
+    with phase("init_db"):
+        init_db()
     app_header()
     sidebar_menu()
 
-    user = session.get_current_user()
-    if not user:
-        callback_user = _handle_oauth_callback()
-        if callback_user:
-            session.set_current_user(callback_user)
-            user = callback_user
+    with phase("auth"):
+        user = session.get_current_user()
+        if not user:
+            callback_user = _handle_oauth_callback()
+            if callback_user:
+                session.set_current_user(callback_user)
+                user = callback_user
 
     if not user:
-        feature_flags = _get_secret_section("feature_flags")
+        feature_flags = get_secret_section("feature_flags")
         disable_oauth_flag = feature_flags.get("disable_oauth", True)
-        disable_oauth = _coerce_bool(disable_oauth_flag)
-        disable_oauth = disable_oauth or _coerce_bool(os.environ.get("STREAMLIT_DISABLE_OAUTH"))
+        disable_oauth = coerce_bool(disable_oauth_flag)
+        disable_oauth = disable_oauth or coerce_bool(os.environ.get("STREAMLIT_DISABLE_OAUTH"))
 
-        google_oauth_cfg = _get_secret_section("google_oauth")
+        google_oauth_cfg = get_secret_section("google_oauth")
         if not google_oauth_cfg:
             disable_oauth = True
         required_keys = ("client_id", "client_secret")
@@ -142,8 +123,9 @@ def main() -> None:
             _render_login()
             return
 
-        user = _ensure_guest_user()
-        session.set_current_user(user)
+        with phase("auth"):
+            user = _ensure_guest_user()
+            session.set_current_user(user)
         st.info("Executando em modo convidado. Configure o OAuth para habilitar login Google.")
 
     st.success(f"Bem-vindo, {user['full_name']}!")
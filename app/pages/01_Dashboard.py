@@ -6,24 +6,29 @@ import streamlit as st
 from app.auth import session
 from app.data.database import get_session
 from app.data.models import Goal
+from app.profiling import phase, profile_page
 from app.ui.dashboard import render_overview
+from app.ui.layout import user_data_guard
 
 
-def _load_goals(user_id: int) -> list[Goal]:
+def _load_goals(user: dict) -> list[Goal]:
     """Fetch goals for the signed-in user."""
-    with get_session() as db:
-        return list(db.query(Goal).filter(Goal.owner_id == user_id).all())
+    with get_session(user) as db:
+        return list(db.query(Goal).filter(Goal.owner_id == user["id"]).all())
 
 
+@profile_page("dashboard")
 def main() -> None:
     """Render page content."""
-    user = session.get_current_user()
+    with phase("auth"):
+        user = session.get_current_user()
     if not user:
         st.warning("Faça login com sua conta Google para acessar o dashboard.")
         st.stop()
 
     st.header("Dashboard")
-    goals = _load_goals(user_id=user["id"])
+    with phase("data_load"), user_data_guard():
+        goals = _load_goals(user=user)
     if goals:
         render_overview(goals)
     else:
@@ -6,14 +6,16 @@ import streamlit as st
 from app.auth import session
 from app.data.database import get_session
 from app.data.models import Goal
+from app.profiling import phase, profile_page
 from app.ui.forms import goal_form
+from app.ui.layout import user_data_guard
 
 
-def _create_goal(user_id: int, form_data: dict) -> None:
+def _create_goal(user: dict, form_data: dict) -> None:
     """Persist a new goal to the database."""
-    with get_session() as db:
+    with get_session(user) as db:
         goal = Goal(
-            owner_id=user_id,
+            owner_id=user["id"],
             title=form_data["title"],
             description=form_data["description"],
             target_metric=form_data["target_metric"],
@@ -27,13 +29,15 @@ def _create_goal(user_id: int, form_data: dict) -> None:
         db.add(goal)
 
 
-def _list_goals(user_id: int) -> list[Goal]:
-    with get_session() as db:
-        return list(db.query(Goal).filter(Goal.owner_id == user_id).order_by(Goal.created_at.desc()).all())
+def _list_goals(user: dict) -> list[Goal]:
+    with get_session(user) as db:
+        return list(db.query(Goal).filter(Goal.owner_id == user["id"]).order_by(Goal.created_at.desc()).all())
 
 
+@profile_page("goals")
 def main() -> None:
-    user = session.get_current_user()
+    with phase("auth"):
+        user = session.get_current_user()
     if not user:
         st.warning("Faça login para criar e acompanhar objetivos.")
         st.stop()
@@ -41,23 +45,27 @@ def main() -> None:
     st.header("Objetivos e metas")
     st.write("Defina objetivos SMART para impulsionar seu ano.")
 
-    form_data = goal_form()
+    with phase("render"):
+        form_data = goal_form()
     if form_data["submitted"]:
-        _create_goal(user_id=user["id"], form_data=form_data)
+        with phase("data_write"), user_data_guard():
+            _create_goal(user=user, form_data=form_data)
         st.success("Objetivo cadastrado com sucesso!")
 
     st.subheader("Objetivos cadastrados")
-    goals = _list_goals(user_id=user["id"])
+    with phase("data_load"), user_data_guard():
+        goals = _list_goals(user=user)
     if not goals:
         st.info("Nenhum objetivo cadastrado ainda.")
         return
 
-    for goal in goals:
-        with st.expander(goal.title, expanded=False):
-            st.write(goal.description or "Sem descrição")
-            st.write(f"Meta: {goal.target_value} {goal.unit or goal.target_metric}")
-            st.write(f"Atual: {goal.current_value} {goal.unit or goal.target_metric}")
-            st.write(f"Período: {goal.start_date} → {goal.end_date}")
+    with phase("render"):
+        for goal in goals:
+            with st.expander(goal.title, expanded=False):
+                st.write(goal.description or "Sem descrição")
+                st.write(f"Meta: {goal.target_value} {goal.unit or goal.target_metric}")
+                st.write(f"Atual: {goal.current_value} {goal.unit or goal.target_metric}")
+                st.write(f"Período: {goal.start_date} → {goal.end_date}")
 
 
 main()
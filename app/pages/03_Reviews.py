@@ -10,14 +10,16 @@ import streamlit as st
 from app.auth import session
 from app.data.database import get_session
 from app.data.models import Goal, ProgressLog
+from app.profiling import phase, profile_page
+from app.ui.layout import user_data_guard
 
 
-def _load_progress(user_id: int) -> pd.DataFrame:
-    with get_session() as db:
+def _load_progress(user: dict) -> pd.DataFrame:
+    with get_session(user) as db:
         query = (
             db.query(Goal.title, ProgressLog.logged_at, ProgressLog.value, ProgressLog.note)
             .join(ProgressLog, ProgressLog.goal_id == Goal.id)
-            .filter(Goal.owner_id == user_id)
+            .filter(Goal.owner_id == user["id"])
         )
         rows = [
             {
@@ -31,8 +33,10 @@ def _load_progress(user_id: int) -> pd.DataFrame:
     return pd.DataFrame(rows)
 
 
+@profile_page("reviews")
 def main() -> None:
-    user = session.get_current_user()
+    with phase("auth"):
+        user = session.get_current_user()
     if not user:
         st.warning("Faça login para acessar suas revisões.")
         st.stop()
@@ -46,20 +50,23 @@ def main() -> None:
         st.info("Persistência de revisões será implementada na próxima etapa.")
 
     st.subheader("Exportar progresso")
-    progress_df = _load_progress(user_id=user["id"])
+    with phase("data_load"), user_data_guard():
+        progress_df = _load_progress(user=user)
     if progress_df.empty:
         st.info("Ainda não há registros de progresso para exportar.")
         return
 
-    buffer = io.BytesIO()
-    with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
-        progress_df.to_excel(writer, sheet_name="Progresso", index=False)
-    st.download_button(
-        label="Baixar em Excel",
-        data=buffer.getvalue(),
-        file_name="progresso_planos_ano_novo.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
+    with phase("transform"):
+        buffer = io.BytesIO()
+        with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
+            progress_df.to_excel(writer, sheet_name="Progresso", index=False)
+    with phase("render"):
+        st.download_button(
+            label="Baixar em Excel",
+            data=buffer.getvalue(),
+            file_name="progresso_planos_ano_novo.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
 
 
 main()
@@ -0,0 +1,291 @@
+"""Opt-in per-page profiling hooks.
+
+Profiling is enabled by the ``[profiling] enabled`` secret, the
+``PLANOS_PROFILE`` environment variable or the ``profile`` query param when it
+matches the ``[profiling] admin_token`` secret. When disabled, ``profile_page``
+calls the page directly and ``phase`` only performs a context variable lookup.
+
+The default ``sampling`` mode samples stacks from a background thread and
+writes collapsed stacks for flame graphs. The ``deterministic`` mode runs
+cProfile instead and writes pstats plus collapsed stacks derived from its
+caller data; only one page can use it at a time, other reruns fall back to
+sampling and are flagged with ``"fallback": true`` in the summary.
+"""
+from __future__ import annotations
+
+import cProfile
+import json
+import logging
+import os
+import pstats
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+from types import FrameType
+from typing import Any, Callable, Iterator, TypeVar
+
+import streamlit as st
+
+from app.config import coerce_bool, get_secret_section
+
+PROFILE_ENV_VAR = "PLANOS_PROFILE"
+PROFILE_DIR_ENV_VAR = "PLANOS_PROFILE_DIR"
+PROFILE_MODE_ENV_VAR = "PLANOS_PROFILE_MODE"
+PROFILE_QUERY_PARAM = "profile"
+DEFAULT_PROFILE_DIR = "profiles"
+DEFAULT_MAX_RUNS = 50
+DEFAULT_SAMPLE_INTERVAL = 0.005
+MAX_STACK_DEPTH = 64
+SAMPLING_MODE = "sampling"
+DETERMINISTIC_MODE = "deterministic"
+RUN_SUFFIXES = ("pstats", "collapsed", "json")
+RUN_FILE_PATTERN = re.compile(r"^(\d{8}-\d{6}-\d{6}_[\w-]+)\.(?:pstats|collapsed|json)$")
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class _ProfileRun:
+    """Collected measurements for a single page rerun."""
+
+    def __init__(self, page: str) -> None:
+        self.page = page
+        self.started_at = datetime.now()
+        self.requested_mode = SAMPLING_MODE
+        self.mode = SAMPLING_MODE
+        self.phases: dict[str, float] = {}
+        self.calls: Counter[str] = Counter()
+
+    def add_phase(self, name: str, elapsed: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + elapsed
+        self.calls[name] += 1
+
+
+_ACTIVE_RUN: ContextVar[_ProfileRun | None] = ContextVar("planos_profile_run", default=None)
+# cProfile hooks are process-wide on Python 3.12+, so only one run may use them.
+_DETERMINISTIC_LOCK = threading.Lock()
+
+
+class _StackSampler(threading.Thread):
+    """Periodically sample the stack of a thread into collapsed-stack counts."""
+
+    def __init__(self, thread_id: int, interval: float) -> None:
+        super().__init__(name="planos-profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)  # pylint: disable=protected-access
+            if frame is not None:
+                self.stacks[_collapse(frame)] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+def _label(filename: str, name: str, lineno: int) -> str:
+    return f"{Path(filename).name}:{name}:{lineno}"
+
+
+def _collapse(frame: FrameType | None) -> str:
+    """Render a frame chain as a root-first, semicolon separated stack."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(_label(code.co_filename, code.co_name, code.co_firstlineno))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _collapse_stats(profiler: cProfile.Profile) -> Counter[str]:
+    """Derive collapsed stacks, weighted in microseconds, from cProfile data.
+
+    cProfile only records caller/callee pairs, so a function's time is split
+    across its callers in proportion to the time spent under each of them.
+    """
+    stats = pstats.Stats(profiler).stats  # type: ignore[attr-defined]
+    children: dict[tuple, list[tuple[tuple, float]]] = {}
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, caller_stats in callers.items():
+            children.setdefault(caller, []).append((func, caller_stats[3]))
+
+    stacks: Counter[str] = Counter()
+
+    def walk(func: tuple, path: tuple[tuple, ...], budget: float) -> None:
+        _, _, self_time, cumulative, _ = stats[func]
+        scale = budget / cumulative if cumulative else 0.0
+        path = (*path, func)
+        weight = int(self_time * scale * 1_000_000)
+        if weight:
+            stacks[";".join(_label(filename, name, lineno) for filename, lineno, name in path)] += weight
+        if len(path) >= MAX_STACK_DEPTH:
+            return
+        for child, child_time in children.get(func, ()):
+            # Skip recursion and subtrees below a microsecond.
+            if child not in path and child_time * scale >= 1e-6:
+                walk(child, path, child_time * scale)
+
+    for func, (_, _, _, cumulative, callers) in stats.items():
+        if not callers:
+            walk(func, (), cumulative)
+    return stacks
+
+
+def _get_config() -> dict[str, Any]:
+    """Return the ``[profiling]`` secrets section, if any."""
+    return get_secret_section("profiling")
+
+
+def is_enabled(config: dict[str, Any] | None = None) -> bool:
+    """Check whether profiling was requested for the current rerun."""
+    if coerce_bool(os.environ.get(PROFILE_ENV_VAR)):
+        return True
+    config = _get_config() if config is None else config
+    if coerce_bool(config.get("enabled", False)):
+        return True
+    admin_token = config.get("admin_token")
+    if not admin_token:
+        return False
+    values = st.experimental_get_query_params().get(PROFILE_QUERY_PARAM)
+    if not values:
+        return False
+    return secrets.compare_digest(values[0].encode("utf-8"), str(admin_token).encode("utf-8"))
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Record wall time spent in a named phase of the active profile run."""
+    run = _ACTIVE_RUN.get()
+    if run is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        run.add_phase(name, time.perf_counter() - started)
+
+
+def _rotate(directory: Path, max_runs: int) -> None:
+    """Delete the oldest runs so at most ``max_runs`` remain.
+
+    Only files named like profiler output are considered, so a shared
+    directory is safe to use.
+    """
+    runs = sorted(
+        {match.group(1) for path in directory.iterdir() if (match := RUN_FILE_PATTERN.match(path.name))}
+    )
+    for stem in runs[: max(len(runs) - max_runs, 0)]:
+        for suffix in RUN_SUFFIXES:
+            (directory / f"{stem}.{suffix}").unlink(missing_ok=True)
+
+
+def _start_deterministic() -> cProfile.Profile | None:
+    """Enable cProfile, or return None when another run already holds it."""
+    if not _DETERMINISTIC_LOCK.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:  # Another profiling tool is active (Python 3.12+).
+        _DETERMINISTIC_LOCK.release()
+        return None
+    return profiler
+
+
+def _write_profile(
+    run: _ProfileRun,
+    profiler: cProfile.Profile | None,
+    sampler: _StackSampler | None,
+    total: float,
+    config: dict[str, Any],
+) -> None:
+    """Persist pstats, collapsed stacks and phase timings for a rerun."""
+    directory = Path(
+        os.environ.get(PROFILE_DIR_ENV_VAR) or config.get("directory") or DEFAULT_PROFILE_DIR
+    )
+    directory.mkdir(parents=True, exist_ok=True)
+    stem = f"{run.started_at:%Y%m%d-%H%M%S-%f}_{run.page}"
+
+    if profiler is not None:
+        profiler.dump_stats(directory / f"{stem}.pstats")
+        stacks = _collapse_stats(profiler)
+    else:
+        stacks = sampler.stacks if sampler is not None else Counter()
+    with open(directory / f"{stem}.collapsed", "w", encoding="utf-8") as handle:
+        for stack, count in stacks.most_common():
+            handle.write(f"{stack} {count}\n")
+    summary = {
+        "page": run.page,
+        "mode": run.mode,
+        "fallback": run.mode != run.requested_mode,
+        "collapsed_unit": "microseconds" if profiler is not None else "samples",
+        "started_at": run.started_at.isoformat(),
+        "total_seconds": total,
+        "phases": {
+            name: {"seconds": seconds, "calls": run.calls[name]}
+            for name, seconds in run.phases.items()
+        },
+        "samples": sum(sampler.stacks.values()) if sampler is not None else 0,
+    }
+    with open(directory / f"{stem}.json", "w", encoding="utf-8") as handle:
+        json.dump(summary, handle, indent=2)
+
+    _rotate(directory, int(config.get("max_runs", DEFAULT_MAX_RUNS)))
+
+
+def profile_page(page: str) -> Callable[[F], F]:
+    """Wrap a page ``main()`` so each rerun is profiled when enabled."""
+
+    def decorator(func: F) -> F:
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            config = _get_config()
+            if not is_enabled(config):
+                return func(*args, **kwargs)
+
+            run = _ProfileRun(page)
+            token = _ACTIVE_RUN.set(run)
+            mode = os.environ.get(PROFILE_MODE_ENV_VAR) or config.get("mode", SAMPLING_MODE)
+            run.requested_mode = mode
+            profiler = _start_deterministic() if mode == DETERMINISTIC_MODE else None
+            sampler = None
+            if profiler is None:
+                interval = float(config.get("sample_interval", DEFAULT_SAMPLE_INTERVAL))
+                sampler = _StackSampler(threading.get_ident(), interval)
+                sampler.start()
+            else:
+                run.mode = DETERMINISTIC_MODE
+            started = time.perf_counter()
+            try:
+                # st.stop() and st.rerun() raise, so results are written in finally.
+                return func(*args, **kwargs)
+            finally:
+                total = time.perf_counter() - started
+                if profiler is not None:
+                    profiler.disable()
+                    _DETERMINISTIC_LOCK.release()
+                if sampler is not None:
+                    sampler.stop()
+                _ACTIVE_RUN.reset(token)
+                try:
+                    _write_profile(run, profiler, sampler, total, config)
+                except Exception:  # Profiling must never break the page.
+                    logger.exception("Could not write profile for page %s", page)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
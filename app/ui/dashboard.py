@@ -8,6 +8,7 @@ import pandas as pd
 import streamlit as st
 
 from app.data.models import Goal, ProgressLog
+from app.profiling import phase
 
 
 def _progress_dataframe(goal: Goal) -> pd.DataFrame:
@@ -26,27 +27,35 @@ def _progress_dataframe(goal: Goal) -> pd.DataFrame:
 def render_overview(goals: Iterable[Goal]) -> None:
     """Display overview metrics and charts."""
     goals = list(goals)
-    st.subheader("Resumo do ano")
-    col1, col2, col3 = st.columns(3)
-    col1.metric("Objetivos ativos", len(goals))
-    total_target = sum(goal.target_value for goal in goals)
-    total_current = sum(goal.current_value for goal in goals)
-    completion = 0 if total_target == 0 else int((total_current / total_target) * 100)
-    col2.metric("Progresso consolidado", f"{completion}%")
-    col3.metric("Última atualização", _latest_update(goals))
-
-    chart_data = pd.concat([
-        _progress_dataframe(goal) for goal in goals if goal.progress_logs
-    ], ignore_index=True)
+    with phase("data_load"):
+        # Progress logs are loaded lazily on first access.
+        latest_update = _latest_update(goals)
+    with phase("transform"):
+        total_target = sum(goal.target_value for goal in goals)
+        total_current = sum(goal.current_value for goal in goals)
+        completion = 0 if total_target == 0 else int((total_current / total_target) * 100)
+    with phase("render"):
+        st.subheader("Resumo do ano")
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Objetivos ativos", len(goals))
+        col2.metric("Progresso consolidado", f"{completion}%")
+        col3.metric("Última atualização", latest_update)
+
+    with phase("transform"):
+        chart_data = pd.concat([
+            _progress_dataframe(goal) for goal in goals if goal.progress_logs
+        ], ignore_index=True)
+        if not chart_data.empty:
+            chart_data.sort_values("timestamp", inplace=True)
+            chart = chart_data.pivot_table(
+                index="timestamp",
+                columns="goal",
+                values="value",
+                aggfunc="max",
+            )
     if not chart_data.empty:
-        chart_data.sort_values("timestamp", inplace=True)
-        chart = chart_data.pivot_table(
-            index="timestamp",
-            columns="goal",
-            values="value",
-            aggfunc="max",
-        )
-        st.line_chart(chart)
+        with phase("render"):
+            st.line_chart(chart)
     else:
         st.info("Registre progresso para visualizar seu avanço ao longo do tempo.")
 
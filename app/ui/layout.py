@@ -1,8 +1,13 @@
 """Reusable layout components."""
 from __future__ import annotations
 
+from contextlib import contextmanager
+from typing import Iterator
+
 import streamlit as st
 
+from app.data.sharding import UserMovingError
+
 
 def app_header() -> None:
     """Render top header with title and description."""
@@ -14,3 +19,13 @@ def sidebar_menu() -> None:
     """Render sidebar with navigation tips."""
     st.sidebar.header("Navegação")
     st.sidebar.write("Use as páginas para registrar metas, marcar marcos e revisar seu progresso.")
+
+
+@contextmanager
+def user_data_guard() -> Iterator[None]:
+    """Ask the user to retry instead of failing while their data is being moved."""
+    try:
+        yield
+    except UserMovingError:
+        st.warning("Seus dados estão sendo reorganizados. Tente novamente em alguns instantes.")
+        st.stop()
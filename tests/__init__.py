@@ -0,0 +1 @@
+"""Automated tests for the planning app."""
@@ -0,0 +1,29 @@
+"""Shared pytest fixtures."""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from app.data import database
+
+
+@pytest.fixture
+def shard_dbs(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Path]:
+    """Point the directory and shard databases at temporary SQLite files."""
+    directory_engine = database._create_engine(f"sqlite:///{tmp_path / 'planos.db'}")
+    original_engine = database.engine
+    monkeypatch.setattr(database, "engine", directory_engine)
+    monkeypatch.setattr(database, "SHARD_DB_URL_TEMPLATE", f"sqlite:///{tmp_path}/planos_shard_{{index}}.db")
+    monkeypatch.setattr(database, "SHARD_COUNT", 2)
+    monkeypatch.setattr(database, "_shard_engines", {})
+    database.SessionLocal.configure(bind=directory_engine)
+    database.init_db()
+    try:
+        yield tmp_path
+    finally:
+        database.SessionLocal.configure(bind=original_engine)
+        for shard_engine in database._shard_engines.values():
+            shard_engine.dispose()
+        directory_engine.dispose()
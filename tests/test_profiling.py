@@ -0,0 +1,158 @@
+"""Tests for the opt-in page profiling hooks."""
+from __future__ import annotations
+
+import json
+import logging
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+from app import profiling  # noqa: E402
+
+
+class _Stop(Exception):
+    """Stands in for the control-flow exception raised by ``st.stop()``."""
+
+
+@pytest.fixture
+def profile_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Write profiles to a temporary directory with profiling disabled by default."""
+    monkeypatch.setenv(profiling.PROFILE_DIR_ENV_VAR, str(tmp_path))
+    monkeypatch.delenv(profiling.PROFILE_ENV_VAR, raising=False)
+    monkeypatch.delenv(profiling.PROFILE_MODE_ENV_VAR, raising=False)
+    monkeypatch.setattr(profiling, "_get_config", lambda: {})
+    monkeypatch.setattr(profiling.st, "experimental_get_query_params", lambda: {}, raising=False)
+    return tmp_path
+
+
+def _summaries(directory: Path) -> list[dict]:
+    return [json.loads(path.read_text()) for path in sorted(directory.glob("*.json"))]
+
+
+def test_phase_is_noop_without_active_run(profile_dir):
+    with profiling.phase("data_load"):
+        pass
+
+    assert profiling._ACTIVE_RUN.get() is None
+    assert list(profile_dir.iterdir()) == []
+
+
+def test_disabled_page_writes_nothing(profile_dir):
+    @profiling.profile_page("dashboard")
+    def main():
+        with profiling.phase("render"):
+            return "ok"
+
+    assert main() == "ok"
+    assert list(profile_dir.iterdir()) == []
+
+
+def test_is_enabled_by_env_secret_or_token(profile_dir, monkeypatch):
+    assert not profiling.is_enabled({})
+    assert profiling.is_enabled({"enabled": "true"})
+
+    monkeypatch.setattr(profiling.st, "experimental_get_query_params", lambda: {"profile": ["s3cret"]})
+    assert profiling.is_enabled({"admin_token": "s3cret"})
+    assert not profiling.is_enabled({"admin_token": "other"})
+
+    monkeypatch.setenv(profiling.PROFILE_ENV_VAR, "1")
+    assert profiling.is_enabled({})
+
+
+def test_phase_times_accumulate(profile_dir, monkeypatch):
+    monkeypatch.setenv(profiling.PROFILE_ENV_VAR, "1")
+
+    @profiling.profile_page("goals")
+    def main():
+        for _ in range(2):
+            with profiling.phase("data_load"):
+                sum(range(1000))
+        with profiling.phase("render"):
+            pass
+
+    main()
+
+    (summary,) = _summaries(profile_dir)
+    assert summary["page"] == "goals"
+    assert summary["phases"]["data_load"]["calls"] == 2
+    assert summary["phases"]["data_load"]["seconds"] > 0
+    assert summary["phases"]["render"]["calls"] == 1
+
+
+@pytest.mark.parametrize(
+    ("mode", "suffixes"),
+    [
+        (profiling.SAMPLING_MODE, {".collapsed", ".json"}),
+        (profiling.DETERMINISTIC_MODE, {".collapsed", ".json", ".pstats"}),
+    ],
+)
+def test_profile_page_writes_files_when_page_stops(profile_dir, monkeypatch, mode, suffixes):
+    monkeypatch.setenv(profiling.PROFILE_ENV_VAR, "1")
+    monkeypatch.setenv(profiling.PROFILE_MODE_ENV_VAR, mode)
+
+    @profiling.profile_page("reviews")
+    def main():
+        sum(i * i for i in range(20000))
+        raise _Stop
+
+    with pytest.raises(_Stop):
+        main()
+
+    assert {path.suffix for path in profile_dir.iterdir()} == suffixes
+    (summary,) = _summaries(profile_dir)
+    assert (summary["mode"], summary["fallback"]) == (mode, False)
+    if mode == profiling.DETERMINISTIC_MODE:
+        (collapsed,) = profile_dir.glob("*.collapsed")
+        assert "test_profiling.py:main:" in collapsed.read_text()
+
+
+def test_deterministic_run_falls_back_when_profiler_busy(profile_dir, monkeypatch):
+    monkeypatch.setenv(profiling.PROFILE_ENV_VAR, "1")
+    monkeypatch.setenv(profiling.PROFILE_MODE_ENV_VAR, profiling.DETERMINISTIC_MODE)
+
+    @profiling.profile_page("dashboard")
+    def main():
+        pass
+
+    with profiling._DETERMINISTIC_LOCK:
+        main()
+
+    (summary,) = _summaries(profile_dir)
+    assert (summary["mode"], summary["fallback"]) == (profiling.SAMPLING_MODE, True)
+    assert not list(profile_dir.glob("*.pstats"))
+
+
+def test_failed_write_is_logged_and_keeps_page_exception(profile_dir, monkeypatch, caplog):
+    monkeypatch.setenv(profiling.PROFILE_ENV_VAR, "1")
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(profiling, "_write_profile", fail)
+
+    @profiling.profile_page("dashboard")
+    def main():
+        raise _Stop
+
+    with caplog.at_level(logging.ERROR, logger=profiling.__name__), pytest.raises(_Stop):
+        main()
+
+    assert "Could not write profile for page dashboard" in caplog.text
+
+
+def test_rotate_keeps_latest_runs_and_ignores_other_files(tmp_path):
+    stems = [f"20260101-00000{index}-000000_dashboard" for index in range(4)]
+    for stem in stems:
+        for suffix in profiling.RUN_SUFFIXES:
+            (tmp_path / f"{stem}.{suffix}").touch()
+    unrelated = ["notes.json", "old.pstats", f"{stems[0]}.log", "20250101-000000-000000.json"]
+    for name in unrelated:
+        (tmp_path / name).touch()
+
+    profiling._rotate(tmp_path, max_runs=2)
+
+    remaining = {path.name for path in tmp_path.iterdir()}
+    expected_runs = {f"{stem}.{suffix}" for stem in stems[2:] for suffix in profiling.RUN_SUFFIXES}
+    assert remaining == expected_runs | set(unrelated)
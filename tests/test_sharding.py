@@ -0,0 +1,300 @@
+"""Tests for shard routing, moves and rebalancing."""
+from __future__ import annotations
+
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from app.data import database, sharding
+from app.data.database import get_session, shard_session
+from app.data.models import Goal, LegacyGoalImport, Milestone, ProgressLog, ShardAssignment, User
+
+
+def _create_user(google_sub: str) -> dict:
+    with get_session() as db:
+        user = User(google_sub=google_sub, email=f"{google_sub}@local", full_name=google_sub)
+        db.add(user)
+        db.flush()
+        return {"id": user.id, "google_sub": user.google_sub}
+
+
+def _create_goal(user: dict, title: str = "Correr") -> None:
+    with get_session(user) as db:
+        goal = Goal(owner_id=user["id"], title=title, target_metric="km", target_value=100.0)
+        goal.milestones = [Milestone(name="Metade", target_value=50.0)]
+        goal.progress_logs = [ProgressLog(value=10.0), ProgressLog(value=20.0)]
+        db.add(goal)
+
+
+def _goal_counts(shard: int, user_id: int) -> tuple[int, int, int]:
+    db = shard_session(shard)
+    try:
+        goal_ids = [goal_id for (goal_id,) in db.query(Goal.id).filter(Goal.owner_id == user_id)]
+        return (
+            len(goal_ids),
+            db.query(Milestone).filter(Milestone.goal_id.in_(goal_ids)).count(),
+            db.query(ProgressLog).filter(ProgressLog.goal_id.in_(goal_ids)).count(),
+        )
+    finally:
+        db.close()
+
+
+def _assignment(user_id: int) -> ShardAssignment:
+    with get_session() as db:
+        assignment = db.get(ShardAssignment, user_id)
+        db.expunge(assignment)
+        return assignment
+
+
+def test_resolve_shard_assigns_and_persists(shard_dbs):
+    user = _create_user("abc")
+
+    shard = sharding.resolve_shard(user)
+
+    assert shard == sharding.shard_for_key("abc")
+    assert _assignment(user["id"]).shard == shard
+    with get_session() as db:
+        db.get(ShardAssignment, user["id"]).shard = 1 - shard
+    assert sharding.resolve_shard(user) == 1 - shard
+
+
+def test_get_session_routes_goals_to_user_shard(shard_dbs):
+    user = _create_user("abc")
+    _create_goal(user)
+
+    shard = sharding.resolve_shard(user)
+    assert _goal_counts(shard, user["id"]) == (1, 1, 2)
+    assert _goal_counts(1 - shard, user["id"]) == (0, 0, 0)
+
+
+def test_move_user_moves_goal_tree_and_updates_map(shard_dbs):
+    user = _create_user("abc")
+    _create_goal(user)
+    _create_goal(user, title="Ler")
+    source = sharding.resolve_shard(user)
+    target = 1 - source
+
+    assert sharding.move_user(user["id"], target) == 2
+
+    assert _goal_counts(target, user["id"]) == (2, 2, 4)
+    assert _goal_counts(source, user["id"]) == (0, 0, 0)
+    assignment = _assignment(user["id"])
+    assert (assignment.shard, assignment.moving) == (target, False)
+    with get_session(user) as db:
+        assert sorted(goal.title for goal in db.query(Goal)) == ["Correr", "Ler"]
+
+
+def test_move_user_replaces_rows_left_by_interrupted_move(shard_dbs):
+    user = _create_user("abc")
+    _create_goal(user)
+    source = sharding.resolve_shard(user)
+    target = 1 - source
+    db = shard_session(target)
+    db.add(Goal(owner_id=user["id"], title="Parcial", target_metric="km", target_value=1.0))
+    db.commit()
+    db.close()
+    with get_session() as db:
+        db.get(ShardAssignment, user["id"]).moving = True
+
+    sharding.move_user(user["id"], target)
+
+    assert _goal_counts(target, user["id"]) == (1, 1, 2)
+
+
+def test_get_session_rejects_user_while_moving(shard_dbs):
+    user = _create_user("abc")
+    sharding.resolve_shard(user)
+    with get_session() as db:
+        db.get(ShardAssignment, user["id"]).moving = True
+
+    with pytest.raises(sharding.UserMovingError):
+        with get_session(user):
+            pass
+
+
+def test_move_user_rejects_out_of_range_target(shard_dbs):
+    user = _create_user("abc")
+
+    with pytest.raises(ValueError):
+        sharding.move_user(user["id"], database.SHARD_COUNT)
+
+
+def test_rebalance_after_growing_shard_count(shard_dbs, monkeypatch):
+    monkeypatch.setattr(database, "SHARD_COUNT", 1)
+    users = [_create_user(f"user-{index}") for index in range(8)]
+    for user in users:
+        _create_goal(user)
+
+    monkeypatch.setattr(database, "SHARD_COUNT", 4)
+    database.init_db()
+    moved = sharding.rebalance()
+
+    homes = {user["id"]: sharding.shard_for_key(user["google_sub"]) for user in users}
+    assert set(moved) == {user_id for user_id, home in homes.items() if home != 0}
+    for user_id, home in homes.items():
+        assert _assignment(user_id).shard == home
+        assert _goal_counts(home, user_id) == (1, 1, 2)
+        if home != 0:
+            assert _goal_counts(0, user_id) == (0, 0, 0)
+
+
+def test_rebalance_after_shrinking_shard_count(shard_dbs, monkeypatch):
+    monkeypatch.setattr(database, "SHARD_COUNT", 4)
+    database.init_db()
+    users = [_create_user(f"user-{index}") for index in range(8)]
+    for user in users:
+        _create_goal(user)
+    assert any(sharding.resolve_shard(user) >= 2 for user in users)
+
+    monkeypatch.setattr(database, "SHARD_COUNT", 2)
+    for user in users:
+        # Users on retired shards stay reachable until rebalanced.
+        with get_session(user) as db:
+            assert db.query(Goal).filter(Goal.owner_id == user["id"]).count() == 1
+    sharding.rebalance()
+
+    for user in users:
+        shard = _assignment(user["id"]).shard
+        assert shard < 2
+        assert _goal_counts(shard, user["id"]) == (1, 1, 2)
+
+
+def _create_legacy_goal(tmp_path, goal_id: int, owner_id: int, title: str) -> None:
+    tables = database.Base.metadata.tables
+    database.Base.metadata.create_all(
+        bind=database.engine,
+        tables=[tables[name] for name in ("goals", "milestones", "progress_logs")],
+    )
+    connection = sqlite3.connect(tmp_path / "planos.db")
+    created_at = datetime(2025, 1, 1).isoformat(sep=" ")
+    connection.execute(
+        "INSERT INTO goals (id, owner_id, title, target_metric, target_value, current_value, created_at)"
+        " VALUES (?, ?, ?, 'km', 10, 2, ?)",
+        (goal_id, owner_id, title, created_at),
+    )
+    connection.execute(
+        "INSERT INTO progress_logs (goal_id, logged_at, value) VALUES (?, ?, 2)",
+        (goal_id, created_at),
+    )
+    connection.commit()
+    connection.close()
+
+
+def _legacy_goal_count(tmp_path) -> int:
+    connection = sqlite3.connect(tmp_path / "planos.db")
+    try:
+        return connection.execute("SELECT COUNT(*) FROM goals").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def _titles(user: dict) -> list[str]:
+    with get_session(user) as db:
+        return sorted(goal.title for goal in db.query(Goal).filter(Goal.owner_id == user["id"]))
+
+
+def test_migrate_legacy_keeps_goals_whose_ids_collide(shard_dbs):
+    first = _create_user("first")
+    second = _create_user("second")
+    # Goals created on the shards after deploy take ids 1 and 2 on shard 0.
+    with get_session() as db:
+        for user in (first, second):
+            db.add(ShardAssignment(user_id=user["id"], shard=0, moving=False))
+    _create_goal(first, title="new")
+    _create_goal(second, title="new")
+    _create_legacy_goal(shard_dbs, goal_id=1, owner_id=first["id"], title="legacy")
+    _create_legacy_goal(shard_dbs, goal_id=2, owner_id=second["id"], title="legacy")
+
+    assert sharding.migrate_legacy() == 2
+
+    assert _titles(first) == ["legacy", "new"]
+    assert _titles(second) == ["legacy", "new"]
+    assert _legacy_goal_count(shard_dbs) == 0
+
+
+def test_migrate_legacy_is_rerunnable_after_interruption(shard_dbs):
+    user = _create_user("legacy")
+    _create_legacy_goal(shard_dbs, goal_id=7, owner_id=user["id"], title="legacy")
+    # Simulate a run interrupted after copying the goal but before deleting it.
+    with get_session(user) as db:
+        copy = Goal(owner_id=user["id"], title="legacy", target_metric="km", target_value=10.0)
+        db.add(copy)
+        db.flush()
+        db.add(LegacyGoalImport(legacy_goal_id=7, goal_id=copy.id))
+
+    assert sharding.migrate_legacy() == 1
+    assert sharding.migrate_legacy() == 0
+
+    assert _titles(user) == ["legacy"]
+    assert _legacy_goal_count(shard_dbs) == 0
+
+
+def test_move_user_carries_legacy_import_markers(shard_dbs):
+    user = _create_user("legacy")
+    _create_legacy_goal(shard_dbs, goal_id=7, owner_id=user["id"], title="legacy")
+    sharding.migrate_legacy()
+    source = sharding.resolve_shard(user)
+
+    sharding.move_user(user["id"], 1 - source)
+
+    with get_session(user) as db:
+        marker = db.get(LegacyGoalImport, 7)
+        assert db.get(Goal, marker.goal_id).title == "legacy"
+    db = shard_session(source)
+    try:
+        assert db.query(LegacyGoalImport).count() == 0
+    finally:
+        db.close()
+
+
+def test_write_racing_a_move_fails_instead_of_landing_on_old_shard(shard_dbs):
+    user = _create_user("abc")
+    source = sharding.resolve_shard(user)
+    target = 1 - source
+
+    with pytest.raises(sharding.UserMovingError):
+        with get_session(user) as db:
+            sharding.move_user(user["id"], target)
+            db.add(Goal(owner_id=user["id"], title="Atrasado", target_metric="km", target_value=1.0))
+
+    assert _goal_counts(source, user["id"]) == (0, 0, 0)
+    assert _goal_counts(target, user["id"]) == (0, 0, 0)
+
+
+def test_write_while_moving_flag_set_is_rolled_back(shard_dbs):
+    user = _create_user("abc")
+    sharding.resolve_shard(user)
+
+    with pytest.raises(sharding.UserMovingError):
+        with get_session(user) as db:
+            with get_session() as directory:
+                directory.get(ShardAssignment, user["id"]).moving = True
+            db.add(Goal(owner_id=user["id"], title="Atrasado", target_metric="km", target_value=1.0))
+
+    assert _goal_counts(sharding.shard_for_key("abc"), user["id"]) == (0, 0, 0)
+
+
+def test_init_db_creates_tables_once_per_engine(shard_dbs, monkeypatch):
+    database.get_shard_engine(0)
+    calls = []
+    create_all = database.Base.metadata.create_all
+    monkeypatch.setattr(
+        database.Base.metadata,
+        "create_all",
+        lambda *args, **kwargs: calls.append(kwargs["bind"]) or create_all(*args, **kwargs),
+    )
+
+    database.init_db()
+    database.get_shard_engine(0)
+    assert calls == []
+
+    database.get_shard_engine(5)
+    database.get_shard_engine(5)
+    assert len(calls) == 1
+
+
+def test_databases_use_wal(shard_dbs):
+    for target in (database.engine, database.get_shard_engine(0)):
+        with target.connect() as connection:
+            assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"